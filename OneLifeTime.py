@@ -1,74 +1,296 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from dateutil import relativedelta
-import pytz
+import numpy as np
+import hashlib
+import os
+import time
+from pathlib import Path
+from datetime import datetime
+from zoneinfo import ZoneInfo, available_timezones
 import streamlit.components.v1 as components
 
 # Page configuration
 st.set_page_config(page_title="OneLifeTime", layout="wide")
 
 # --- Global CSS for Button & Table Text Colors ---
-st.markdown("""
-<style>
-  /* Make the primary button green with gray text */
-  div.stButton > button {
-    background-color: #4CAF50 !important;
-    color: black !important;
-    border: none !important;
-  }
-  /* Force all in‐app tables to show gray text */
-  table, table th, table td {
-    color: gray !important;
-  }
-</style>
-""", unsafe_allow_html=True)
+# Minified: it has to be re-sent on every rerun, since Streamlit drops
+# elements a rerun does not emit again.
+GLOBAL_STYLE = (
+    "<style>"
+    # primary button green with black text
+    "div.stButton>button{background-color:#4CAF50!important;color:black!important;border:none!important}"
+    # all in-app tables show gray text
+    "table,table th,table td{color:gray!important}"
+    "</style>"
+)
+st.markdown(GLOBAL_STYLE, unsafe_allow_html=True)
 
 st.title("OneLifeTime")
 st.write("Ever wondered how many seconds you might have left to live? OneLifeTime is a playful yet thought-provoking web app that gives you a live countdown.")
 
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+REQUIRED_COLS = ("Country","Females Life Expectancy","Males Life Expectancy")
+
+# --- Header aliases: a header matches when it contains every pattern (regex) ---
+# ("(?<!fe)male" keeps "female" headers out of the male column)
+COLUMN_ALIASES = {
+    ("country",):                 "Country",
+    ("female", "expectancy"):     "Females Life Expectancy",
+    ("(?<!fe)male", "expectancy"): "Males Life Expectancy",
+}
+
+def canonical_columns(columns):
+    # one vectorized Index.str pass per pattern; the first matching header wins
+    lowered = columns.astype(str).str.strip().str.lower()
+    rename  = {}
+    for patterns, name in COLUMN_ALIASES.items():
+        mask = np.logical_and.reduce([lowered.str.contains(p, regex=True) for p in patterns])
+        hits = columns[mask]
+        if len(hits):
+            rename[hits[0]] = name
+    return rename
+
 # --- Fallback life‐expectancy data ---
 FALLBACK = pd.DataFrame({
-    "Country": ["USA","Japan","India","Brazil","Nigeria"],
+    "Country": pd.Categorical(["USA","Japan","India","Brazil","Nigeria"]),
     "Females Life Expectancy":[81.1,87.5,70.7,79.4,65.2],
     "Males Life Expectancy":  [76.1,81.1,68.2,72.8,62.7]
 })
 
-@st.cache_data
-def load_life_expectancy():
+# --- Parsed-data cache: the only on-disk layer, survives restarts (ONELIFETIME_NO_CACHE=1 bypasses it) ---
+DATA_FILE    = "world-lifeexpectancy.xlsx"
+SIDECAR_FILE = "world-lifeexpectancy.parquet"
+CACHE_DIR    = Path(".cache")
+CACHE_VERSION = 2  # bump whenever the cached frame's columns or dtypes change
+
+def data_file_stat():
+    # cheap (mtime, size) key so an edited workbook invalidates st.cache_data
     try:
-        df = pd.read_excel("world-lifeexpectancy.xlsx")
-    except:
-        return FALLBACK
+        info = os.stat(DATA_FILE)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+def parse_life_expectancy():
+    # raises on any failure; load_life_expectancy turns that into FALLBACK
+    with open(DATA_FILE, "rb") as f:
+        digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+    use_cache  = not os.environ.get("ONELIFETIME_NO_CACHE")
+    cache_path = CACHE_DIR / f"{DATA_FILE}.{digest}.v{CACHE_VERSION}.parquet"
+    if use_cache and cache_path.exists():
+        try:
+            return pd.read_parquet(cache_path, engine="pyarrow")
+        except (OSError, ValueError):
+            # truncated or corrupt cache: drop it and re-parse the workbook
+            cache_path.unlink(missing_ok=True)
+
+    df = None
+    if (os.path.exists(SIDECAR_FILE)
+            and os.path.getmtime(SIDECAR_FILE) >= os.path.getmtime(DATA_FILE)):
+        # columnar copy written by scripts/convert_xlsx.py
+        try:
+            df = pd.read_parquet(SIDECAR_FILE, engine="pyarrow")
+        except (OSError, ValueError):
+            pass  # unreadable sidecar: parse the workbook instead
+    if df is None:
+        # only decode the columns the header normalisation below can use
+        usecols = lambda c: any(k in str(c).lower() for k in ("country", "expectancy"))
+        try:
+            # Rust-based parser, roughly twice as fast as openpyxl on cold start
+            df = pd.read_excel(DATA_FILE, engine="calamine", usecols=usecols)
+        except (ImportError, ValueError):
+            # no python-calamine, or pandas < 2.2 ("Unknown engine: calamine")
+            df = pd.read_excel(DATA_FILE, usecols=usecols)
+
+    df = df.rename(columns=canonical_columns(df.columns))
+    cols_set = set(df.columns)
+    missing  = [c for c in REQUIRED_COLS if c not in cols_set]
+    if missing:
+        raise ValueError(f"{DATA_FILE} has no column for {missing}")
 
-    col_map = {}
-    for col in df.columns:
-        lower = col.strip().lower()
-        if "country" in lower:
-            col_map[col] = "Country"
-        elif "female" in lower and "expectancy" in lower:
-            col_map[col] = "Females Life Expectancy"
-        elif "male" in lower and "expectancy" in lower:
-            col_map[col] = "Males Life Expectancy"
-
-    df = df.rename(columns=col_map)
-    req = {"Country","Females Life Expectancy","Males Life Expectancy"}
-    if not req.issubset(df.columns):
+    # integer-coded countries: cheaper equality, unique() and hashing downstream
+    df = df.loc[:, list(REQUIRED_COLS)].astype({"Country": "category"})
+    if use_cache:
+        try:
+            CACHE_DIR.mkdir(exist_ok=True)
+            # write then rename, so other workers never see a half-written file
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # read-only deploys just skip the disk cache
+    return df
+
+@st.cache_data(show_spinner=False)
+def load_life_expectancy(stat_key):
+    # memory-only, keyed on stat_key so an edited workbook is re-read;
+    # a failed load serves FALLBACK now and is retried after a restart
+    try:
+        return parse_life_expectancy()
+    except Exception:
         return FALLBACK
 
-    return df[["Country","Females Life Expectancy","Males Life Expectancy"]]
+# (mtime, size) of the workbook: a cheap cache key for everything derived from it
+stat_key = data_file_stat()
+
+# --- Country lookups, keyed on stat_key so no DataFrame is hashed per rerun ---
+@st.cache_data
+def country_index(stat_key):
+    df = load_life_expectancy(stat_key)
+    return {c: (m, f) for c, m, f in zip(df["Country"],
+                                         df["Males Life Expectancy"],
+                                         df["Females Life Expectancy"])}
+
+@st.cache_data
+def sorted_countries(stat_key):
+    return sorted(load_life_expectancy(stat_key)["Country"].unique().tolist())
+
+# --- Top/Bottom-n countries, computed once per ranking column (i.e. per sex) ---
+@st.cache_data(show_spinner=False)
+def top_bottom(stat_key, col, n=5):
+    # keyed on stat_key, not the frame, so a cache hit hashes nothing big
+    df = load_life_expectancy(stat_key)[["Country", col]]
+    le = df[col].to_numpy()
+    k  = min(n, le.size)
+    top_idx = np.argpartition(-le, k-1)[:k]
+    top_idx = top_idx[np.argsort(-le[top_idx])]
+    bot_idx = np.argpartition(le, k-1)[:k]
+    bot_idx = bot_idx[np.argsort(le[bot_idx])]
+    return df.iloc[top_idx], df.iloc[bot_idx]
+
+TABLE_STYLE = (
+    "<style>"
+    ".panes{display:flex;flex-wrap:wrap;gap:16px;font-family:sans-serif}"
+    ".pane{flex:1;min-width:320px}"
+    "table{width:100%;border-collapse:collapse;color:black!important}"
+    "thead th{background:#444;padding:8px;color:gray!important}"
+    "td{padding:8px;border-top:1px solid rgba(255,255,255,.2)}"
+    "</style>"
+)
+
+ROW_TEMPLATE = "<tr><td>{}</td><td class='sl'></td><td>{}</td></tr>"
+
+# str.format templates (JS braces doubled; styles are prepended, not formatted)
+TABLE_HEAD = "<thead><tr><th>Country</th><th>Seconds Left</th><th>Projected Death</th></tr></thead>"
+PROJECTION_TEMPLATE = """
+<div class="panes">
+  <div class="pane">
+    <p><b>Top {n_top} Countries</b></p>
+    <table>""" + TABLE_HEAD + """<tbody>{top_rows}</tbody></table>
+  </div>
+  <div class="pane">
+    <p><b>Bottom {n_bot} Countries</b></p>
+    <table>""" + TABLE_HEAD + """<tbody>{bot_rows}</tbody></table>
+  </div>
+</div>
+<script>
+  const fmt     = new Intl.NumberFormat('fr-FR');
+  const birthMs = {birth_ms};
+  const les     = [{les}];
+  const msPerYr = {ms_per_year};
+  const cells   = document.querySelectorAll('td.sl');
+  const deaths  = les.map(le => birthMs + le*msPerYr);
+  const shown   = new Array(cells.length);
+  // seconds left derive from the death timestamps, so nothing can drift;
+  // rAF pauses in hidden tabs and the DOM is touched only when a value changes
+  function tick(){{
+    const now = Date.now();
+    for (let i = 0; i < cells.length; i++) {{
+      const s = Math.floor((deaths[i]-now)/1000);
+      if (s !== shown[i]) {{ shown[i] = s; cells[i].textContent = fmt.format(s); }}
+    }}
+    requestAnimationFrame(tick);
+  }}
+  tick();
+</script>
+"""
 
-life_df = load_life_expectancy()
+# --- Main countdown: a static frontend the browser caches; reruns only send a new deadline ---
+lifetimer = components.declare_component(
+    "lifetimer", path=str(Path(__file__).parent / "lifetimer_frontend"))
+
+# --- Death datetimes for an array of life expectancies, in one vectorized pass ---
+def project_deaths(birth_dt, le_years, tz_name):
+    le_s = np.asarray(le_years, dtype=np.float64) * SECONDS_PER_YEAR
+    return (pd.Timestamp(birth_dt) + pd.to_timedelta(le_s, unit="s")).tz_convert(tz_name)
+
+# --- Projection tables (pure function of their inputs, so they cache across reruns) ---
+def projection_rows(df_slice, sort_col, adjust, birth_dt, tz_name):
+    # vectorized death dates for the whole slice; seconds left are the browser's job
+    le        = df_slice[sort_col].to_numpy(dtype=np.float64) + adjust
+    death     = project_deaths(birth_dt, le, tz_name)
+    death_str = death.strftime('%Y-%m-%d %H:%M:%S')
+    countries = df_slice["Country"].to_numpy()
+
+    rows = list(map(ROW_TEMPLATE.format, countries, death_str))
+    return rows, le.tolist()
+
+@st.cache_data
+def build_projection_html(top, bot, sort_col, adjust, birth_dt, tz_name):
+    # both tables share one iframe: one parse, one stylesheet, one timer
+    # one vectorized pass over both slices, split back into the two tables
+    rows, les = projection_rows(pd.concat([top, bot]), sort_col, adjust, birth_dt, tz_name)
+    top_rows, bot_rows = "".join(rows[:len(top)]), "".join(rows[len(top):])
+    birth_ms = int(birth_dt.timestamp() * 1000)
+
+    return TABLE_STYLE + PROJECTION_TEMPLATE.format(
+        n_top=len(top), n_bot=len(bot), top_rows=top_rows, bot_rows=bot_rows,
+        birth_ms=birth_ms, les=",".join(map(str, les)),
+        ms_per_year=SECONDS_PER_YEAR * 1000,
+    )
+
+# --- Time zones: O(1) index lookup and one tzinfo object per zone ---
+# (st.cache_resource rather than lru_cache: this script re-executes on every rerun)
+# Offered zones: every Area/City name (legacy links such as Asia/Calcutta
+# included) plus the non-regional names pytz.common_timezones listed. This
+# drops localtime, Factory, posix/*, right/*, Etc/* and aliases like GB-Eire.
+TZ_AREAS = ("Africa", "America", "Antarctica", "Arctic", "Asia", "Atlantic",
+            "Australia", "Europe", "Indian", "Pacific")
+TZ_EXTRAS = ("UTC", "GMT",
+             "US/Alaska", "US/Arizona", "US/Central", "US/Eastern",
+             "US/Hawaii", "US/Mountain", "US/Pacific",
+             "Canada/Atlantic", "Canada/Central", "Canada/Eastern",
+             "Canada/Mountain", "Canada/Newfoundland", "Canada/Pacific")
+
+@st.cache_resource
+def tz_options():
+    # stdlib zone names from the system tz database (or the tzdata package)
+    return tuple(sorted(name for name in available_timezones()
+                        if name in TZ_EXTRAS or name.partition("/")[0] in TZ_AREAS))
+
+@st.cache_resource
+def tz_index():
+    return {name: i for i, name in enumerate(tz_options())}
+
+@st.cache_resource
+def tz_for(name):
+    return ZoneInfo(name)
+
+# --- Life-expectancy adjustments in years (dict order is the selectbox order) ---
+GYM_ADJ = {
+    "Less than a year":       1,
+    "Between 1 and 3 years":  4,
+    "More than 3 years":      7,
+}
+SMOKE_ADJ = {
+    "Less than a year":       -1,
+    "Between 1 and 5 years":  -3,
+    "Between 5 and 10 years": -5,
+    "More than 10 years":     -10,
+}
+CANCER_ADJ = -8
 
 # --- User Inputs ---
 col1, col2 = st.columns(2)
 with col1:
-    country = st.selectbox("Select your country", sorted(life_df["Country"]))
+    country = st.selectbox("Select your country", sorted_countries(stat_key))
     sex     = st.radio("Select your sex", ["Male","Female"])
     bdate   = st.date_input("Birth date", min_value=datetime(1900,1,1))
     btime   = st.time_input("Birth time")
-    tz_name = st.selectbox("Time zone", pytz.common_timezones,
-                            index=pytz.common_timezones.index("UTC"))
+    tz_name = st.selectbox("Time zone", tz_options(),
+                           index=tz_index()["UTC"])
 
     # --- New Determinants ---
     gym         = st.radio("Do you do gym?", ["No","Yes"], horizontal=True)
@@ -76,7 +298,7 @@ with col1:
     if gym == "Yes":
         gym_since = st.selectbox(
             "Gym since:",
-            ["Less than a year", "Between 1 and 3 years", "More than 3 years"]
+            tuple(GYM_ADJ)
         )
 
     smoke         = st.radio("Do you smoke?", ["No","Yes"], horizontal=True)
@@ -84,157 +306,77 @@ with col1:
     if smoke == "Yes":
         smoke_since = st.selectbox(
             "Smoking since:",
-            ["Less than a year", "Between 1 and 5 years",
-             "Between 5 and 10 years", "More than 10 years"]
+            tuple(SMOKE_ADJ)
         )
 
     cancer = st.radio("Do you have cancer?", ["No","Yes"], horizontal=True)
 
 with col2:
-    row      = life_df[life_df["Country"]==country].iloc[0]
-    life_exp = row["Males Life Expectancy"] if sex=="Male" else row["Females Life Expectancy"]
+    # one sex branch picks both the user's value and the ranking column
+    male_le, female_le = country_index(stat_key)[country]
+    if sex == "Male":
+        life_exp, sort_col = male_le, "Males Life Expectancy"
+    else:
+        life_exp, sort_col = female_le, "Females Life Expectancy"
+
+# every input the result depends on; a change invalidates the stored result
+inputs = (country, sex, bdate, btime, tz_name,
+          gym, gym_since, smoke, smoke_since, cancer)
 
 # --- Main Calculation ---
 if st.button("Calculate My Life Time"):
-    # timezone-aware birth & now
-    user_tz  = pytz.timezone(tz_name)
-    birth_dt = user_tz.localize(datetime.combine(bdate, btime))
-    now_dt   = datetime.now(user_tz)
-
-    # adjust life expectancy
-    adjust = 0
+    # timezone-aware birth (stdlib zoneinfo: no pytz localize round-trip)
+    birth_dt = datetime.combine(bdate, btime, tzinfo=tz_for(tz_name))
 
-    # gym adjustment
-    if gym == "Yes":
-        if gym_since == "Less than a year":
-            adjust += 1
-        elif gym_since == "Between 1 and 3 years":
-            adjust += 4
-        else:
-            adjust += 7
-
-    # smoking adjustment
-    if smoke == "Yes":
-        if smoke_since == "Less than a year":
-            adjust -= 1
-        elif smoke_since == "Between 1 and 5 years":
-            adjust -= 3
-        elif smoke_since == "Between 5 and 10 years":
-            adjust -= 5
-        else:
-            adjust -= 10
-
-    # cancer adjustment
-    if cancer == "Yes":
-        adjust -= 8
+    # adjust life expectancy: gym, smoking and cancer, each by table lookup
+    adjust = ((GYM_ADJ[gym_since] if gym == "Yes" else 0)
+              + (SMOKE_ADJ[smoke_since] if smoke == "Yes" else 0)
+              + (CANCER_ADJ if cancer == "Yes" else 0))
 
     effective_le = life_exp + adjust
 
-    # Projected death datetime
-    years_int = int(effective_le)
-    days_frac = (effective_le - years_int) * 365.25
-    death_dt  = (
-        birth_dt
-        + relativedelta.relativedelta(years=years_int)
-        + timedelta(days=days_frac)
-    )
+    # Projected death datetime (365.25-day years, as everywhere else)
+    death_dt  = project_deaths(birth_dt, [effective_le], tz_name)[0]
+
+    st.session_state["last_result"] = {
+        "inputs": inputs, "birth_dt": birth_dt, "death_dt": death_dt, "adjust": adjust,
+    }
+
+# --- Results (re-rendered from session state until an input changes) ---
+result = st.session_state.get("last_result")
+if result and result["inputs"] == inputs:
+    birth_dt, death_dt, adjust = result["birth_dt"], result["death_dt"], result["adjust"]
+    # only deltas are needed, so work in epoch seconds (no tzinfo round-trips)
+    now_s     = time.time()
+    sec_lived = int(now_s - birth_dt.timestamp())
+    sec_left  = int(death_dt.timestamp() - now_s)
 
-    sec_lived = int((now_dt - birth_dt).total_seconds())
-    sec_left  = int((death_dt - now_dt).total_seconds())
+    # space-grouped for the metrics; the countdown formats itself in the browser
+    sec_lived_str = f"{sec_lived:_}".replace("_", " ")
+    sec_left_str  = f"{sec_left:_}".replace("_", " ")
 
     # --- Display Lived vs. Left ---
     st.subheader("Your Life in Seconds")
     c1, c2 = st.columns(2)
     with c1:
-        st.metric("Seconds Lived", f"{sec_lived:,}".replace(",", " "))
-        st.write(f"~{sec_lived/(365.25*24*3600):.2f} years")
+        st.metric("Seconds Lived", sec_lived_str)
+        st.write(f"~{sec_lived/SECONDS_PER_YEAR:.2f} years")
     with c2:
-        st.metric("Seconds Left", f"{sec_left:,}".replace(",", " "))
-        st.write(f"~{sec_left/(365.25*24*3600):.2f} years")
+        st.metric("Seconds Left", sec_left_str)
+        st.write(f"~{sec_left/SECONDS_PER_YEAR:.2f} years")
 
     # --- Global Live Countdown ---
-    styled_now = f"{sec_left:,}".replace(",", " ")
-    countdown_html = f"""
-    <div style="
-      font-size:2.5em;
-      color: green;
-      background-color: #e6ffe6;
-      padding:10px;
-      border-radius:8px;
-      text-align:center;
-    " id="global_timer">{styled_now}</div>
-    <script>
-      let countG = {sec_left};
-      setInterval(()=>{{
-        countG--;
-        document.getElementById('global_timer')
-                 .innerText = countG.toLocaleString('fr-FR');
-      }},1000);
-    </script>
-    """
     st.subheader("Live Countdown")
-    components.html(countdown_html, height=120)
+    lifetimer(deadline_ms=int(death_dt.timestamp() * 1000), key="main_countdown")
 
     # --- Projections for Other Countries ---
     st.subheader("What If…? You were in the EXTREME sides of the world!")
-    sort_col = "Males Life Expectancy" if sex=="Male" else "Females Life Expectancy"
-    top5 = life_df.sort_values(sort_col, ascending=False).head(5)
-    bot5 = life_df.sort_values(sort_col, ascending=True).head(5)
-
-    def build_projection_html(df_slice, key_prefix):
-        rows, js_entries = [], []
-        for idx, r in df_slice.iterrows():
-            le = r[sort_col] + adjust
-            dt = (
-                birth_dt
-                + relativedelta.relativedelta(years=int(le))
-                + timedelta(days=(le-int(le))*365.25)
-            )
-            sl = int((dt - now_dt).total_seconds())
-            cell_id = f"{key_prefix}_t{idx}"
-            rows.append(
-                f"<tr>"
-                  f"<td>{r['Country']}</td>"
-                  f"<td id='{cell_id}'>{sl:,}</td>"
-                  f"<td>{dt.strftime('%Y-%m-%d %H:%M:%S')}</td>"
-                f"</tr>"
-            )
-            js_entries.append(f"{{id:'{cell_id}',cnt:{sl}}}")
-
-        html = f"""
-        <style>
-          table {{width:100%;border-collapse:collapse;color:black!important;}}
-          thead th {{background:#444;padding:8px;color:gray!important;}}
-          td {{padding:8px;border-top:1px solid rgba(255,255,255,0.2);}}
-        </style>
-        <table>
-          <thead>
-            <tr><th>Country</th><th>Seconds Left</th><th>Projected Death</th></tr>
-          </thead>
-          <tbody>
-            {''.join(rows)}
-          </tbody>
-        </table>
-        <script>
-          let entries = [{','.join(js_entries)}];
-          setInterval(()=>{{
-            entries.forEach(e=>{{
-              e.cnt--;
-              document.getElementById(e.id)
-                          .innerText = e.cnt.toLocaleString('fr-FR');
-            }});
-          }},1000);
-        </script>
-        """
-        return html
-
-    colA, colB = st.columns(2)
-    with colA:
-        st.markdown("**Top 5 Countries**")
-        components.html(build_projection_html(top5, "top"), height=300)
-    with colB:
-        st.markdown("**Bottom 5 Countries**")
-        components.html(build_projection_html(bot5, "bot"), height=300)
+    top5, bot5 = top_bottom(stat_key, sort_col)
+
+    components.html(
+        build_projection_html(top5, bot5, sort_col, adjust, birth_dt, tz_name),
+        height=340, scrolling=True
+    )
 
   # --- Footer Text ---
     st.markdown("---")
@@ -0,0 +1,37 @@
+"""Convert world-lifeexpectancy.xlsx into a parquet sidecar.
+
+Run once at build/deploy time from the repository root:
+
+    python scripts/convert_xlsx.py
+
+OneLifeTime.py reads world-lifeexpectancy.parquet instead of parsing the
+workbook whenever the sidecar is at least as new as the XLSX.
+"""
+import os
+
+import pandas as pd
+
+SRC = "world-lifeexpectancy.xlsx"
+DST = "world-lifeexpectancy.parquet"
+
+
+def main():
+    try:
+        df = pd.read_excel(SRC, engine="calamine")
+    except (ImportError, ValueError):
+        # no python-calamine, or pandas < 2.2 ("Unknown engine: calamine")
+        df = pd.read_excel(SRC)
+    # write then rename, so an interrupted run never leaves a half-written
+    # sidecar that is newer than the workbook
+    tmp = f"{DST}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd")
+        os.replace(tmp, DST)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"Wrote {DST} ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    main()